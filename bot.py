@@ -1,9 +1,10 @@
+import functools
 import logging
 import re
 import os
 import asyncio
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, List
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ForceReply, InputMediaPhoto
@@ -18,16 +19,17 @@ from telegram.ext import (
 )
 from telegram.error import TelegramError
 
-from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import DuplicateKeyError
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import psutil
 
 from pyrogram import Client
-from pyrogram.types import Message as PyrogramMessage
 from pyrogram.errors import FloodWait
 
 import aiohttp
 import hashlib
+import html
 
 # --- CONFIGURATION ---
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -60,6 +62,10 @@ START_IMAGE = os.getenv("START_IMAGE", "https://graph.org/file/abc123.jpg")
 # TMDB API
 TMDB_API_KEY = os.getenv("TMDB_API_KEY", "")
 
+# Webhook (set WEBHOOK_URL to switch from polling, e.g. on Render)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+PORT = int(os.getenv("PORT", "8080"))
+
 # Features
 AUTO_UPDATE_CHANNEL = os.getenv("AUTO_UPDATE_CHANNEL", "true").lower() == "true"
 MAINTENANCE_MODE = False
@@ -75,19 +81,84 @@ logger = logging.getLogger(__name__)
 mongo_client = None
 db = None
 
+# Shared HTTP session for TMDB (pooled, keep-alive) — created in init_db
+tmdb_session: Optional[aiohttp.ClientSession] = None
+
+# Shared Pyrogram client (MTProto) — bulk message deletes; started in post_init
+pyro_client: Optional[Client] = None
+
+# Bot start time, set in post_init — the dashboards report bot uptime,
+# not host uptime
+BOT_START_TS = time.monotonic()
+
+# Fire-and-forget tasks must be referenced somewhere or the event loop may
+# garbage-collect them mid-flight; track them so shutdown can drain them too.
+# Index jobs can run for hours and are tracked separately so shutdown
+# cancels them instead of waiting them out
+_bg_tasks: set = set()
+_index_tasks: set = set()
+
+def spawn_bg(coro, registry: set = _bg_tasks):
+    task = asyncio.create_task(coro)
+    registry.add(task)
+    task.add_done_callback(registry.discard)
+    return task
+
 async def init_db():
-    global mongo_client, db
+    global mongo_client, db, tmdb_session
     mongo_client = AsyncIOMotorClient(MONGODB_URI)
     db = mongo_client[DB_NAME]
+    # Guard against a sync pymongo client sneaking in — any blocking DB call
+    # would stall the event loop for every concurrent handler
+    assert isinstance(db, AsyncIOMotorDatabase)
+
+    tmdb_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=75),
+        timeout=aiohttp.ClientTimeout(total=10)
+    )
     
     # Create indexes
     await db.files.create_index("file_unique_id", unique=True)
     await db.files.create_index("file_name")
+    await db.files.create_index("file_name_lc")
     await db.files.create_index([("file_name", "text")])
     await db.files.create_index("category")
+    # Covers the result-page query: category equality + (season, episode,
+    # file_name) sort in render_file_list and the $facet page sort
+    await db.files.create_index([("category", 1), ("season", 1), ("episode", 1), ("file_name", 1)])
     await db.users.create_index("user_id", unique=True)
+    await db.users.create_index([("premium", 1), ("premium_expiry", 1)])
     await db.admins.create_index("user_id", unique=True)
-    
+    await db.clone_requests.create_index([("user_id", 1), ("status", 1)])
+    await db.requests.create_index([("status", 1), ("req_date", -1)])
+    await db.tmdb_cache.create_index("fetched_at", expireAfterSeconds=30 * 86400)
+
+    # One-off migration: download history moved from its own collection to
+    # the capped embedded array on the user doc. Carry each user's last 10
+    # rows over (unless the new array already exists), then drop the
+    # orphaned collection.
+    if "history" in await db.list_collection_names():
+        ops = []
+        async for row in db.history.aggregate([
+            {"$sort": {"_id": -1}},
+            {"$group": {"_id": "$user_id", "items": {"$push": {
+                "file_name": "$file_name", "file_id": "$file_id", "dl_date": "$dl_date"
+            }}}},
+            {"$project": {"items": {"$slice": ["$items", 10]}}}
+        ]):
+            ops.append(UpdateOne(
+                {"user_id": row["_id"], "history": {"$exists": False}},
+                {"$set": {"history": row["items"]}}
+            ))
+        if ops:
+            await db.users.bulk_write(ops, ordered=False)
+        await db.history.drop()
+        logger.info(f"Migrated download history for {len(ops)} users")
+
+    # Periodic registration flush
+    global _flusher_task
+    _flusher_task = asyncio.create_task(_registration_flusher())
+
     # Add owner as admin
     await db.admins.update_one(
         {"user_id": OWNER_ID},
@@ -97,84 +168,278 @@ async def init_db():
     
     logger.info("✅ Database initialized")
 
+# --- REGISTRATION BATCHING ---
+# User/group registrations are idempotent upserts, so they are queued and
+# flushed as one bulk_write instead of a round-trip per /start or search
+_user_upsert_queue: List[UpdateOne] = []
+_group_upsert_queue: List[UpdateOne] = []
+_UPSERT_FLUSH_LIMIT = 200
+_flusher_task = None
+
+def register_user(user):
+    """Queue a user upsert for the next bulk flush"""
+    _user_upsert_queue.append(UpdateOne(
+        {"user_id": user.id},
+        {"$set": {
+            "user_id": user.id,
+            "first_name": user.first_name,
+            "username": user.username,
+            "joined_date": datetime.now()
+        }},
+        upsert=True
+    ))
+    if len(_user_upsert_queue) >= _UPSERT_FLUSH_LIMIT:
+        spawn_bg(flush_registrations())
+
+def register_group(chat):
+    """Queue a group upsert for the next bulk flush"""
+    _group_upsert_queue.append(UpdateOne(
+        {"group_id": chat.id},
+        {"$set": {
+            "group_id": chat.id,
+            "title": chat.title,
+            "joined_date": datetime.now()
+        }},
+        upsert=True
+    ))
+    if len(_group_upsert_queue) >= _UPSERT_FLUSH_LIMIT:
+        spawn_bg(flush_registrations())
+
+async def flush_registrations():
+    for queue, coll in ((_user_upsert_queue, db.users), (_group_upsert_queue, db.groups)):
+        if not queue:
+            continue
+        batch = queue[:]
+        queue.clear()
+        try:
+            await coll.bulk_write(batch, ordered=False)
+        except Exception as e:
+            logger.error(f"Registration flush error: {e}")
+
+async def _registration_flusher():
+    while True:
+        await asyncio.sleep(2)
+        await flush_registrations()
+
 # --- DATABASE HELPERS ---
+# Admin/premium status changes rarely but is checked on every inbound
+# message. The admin list is tiny, so cache the whole set: a flood of
+# non-admin forwards then costs set lookups, not one find() per sender
+_admin_set: frozenset = frozenset()
+_admin_set_ts = 0.0
+_premium_cache: Dict[int, tuple] = {}
+_ADMIN_SET_TTL = 60
+_PREMIUM_CACHE_TTL = 120
+
 async def is_admin(user_id: int) -> bool:
-    result = await db.admins.find_one({"user_id": user_id})
-    return result is not None
+    global _admin_set, _admin_set_ts
+    if user_id == OWNER_ID:
+        return True
+    if time.monotonic() - _admin_set_ts > _ADMIN_SET_TTL:
+        docs = await db.admins.find({}, {"user_id": 1, "_id": 0}).to_list(length=None)
+        _admin_set = frozenset(d["user_id"] for d in docs)
+        _admin_set_ts = time.monotonic()
+    return user_id in _admin_set
 
 async def is_premium_user(user_id: int) -> bool:
-    user = await db.users.find_one({"user_id": user_id})
+    entry = _premium_cache.get(user_id)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    user = await db.users.find_one(
+        {"user_id": user_id},
+        {"premium": 1, "premium_expiry": 1, "_id": 0}
+    )
+    premium = False
     if user and user.get("premium", False):
         expiry = user.get("premium_expiry")
         if expiry and expiry > datetime.now():
-            return True
-    return False
+            premium = True
+    _premium_cache[user_id] = (time.monotonic() + _PREMIUM_CACHE_TTL, premium)
+    return premium
+
+# psutil readings are syscalls; cache them briefly so rapid dashboard
+# refreshes render without touching the OS
+_sys_cache = {"ts": 0.0, "v": None}
+
+def sys_snapshot() -> Dict:
+    now = time.monotonic()
+    if _sys_cache["v"] is not None and now - _sys_cache["ts"] < 5:
+        return _sys_cache["v"]
+    v = {
+        "cpu": psutil.cpu_percent(),
+        "ram": psutil.virtual_memory().percent,
+        "disk_free": psutil.disk_usage('/').free,
+    }
+    _sys_cache["ts"] = now
+    _sys_cache["v"] = v
+    return v
+
+# Dashboard stats are refreshed often but can safely be ~30s stale
+_stats_cache = {"ts": 0.0, "v": None}
 
 async def get_stats() -> Dict:
-    users_count = await db.users.count_documents({})
-    groups_count = await db.groups.count_documents({})
-    files_count = await db.files.count_documents({})
-    premium_count = await db.users.count_documents({
-        "premium": True,
-        "premium_expiry": {"$gt": datetime.now()}
-    })
-    
-    # Storage info (approximate)
-    db_stats = await db.command("dbStats")
+    now_mono = time.monotonic()
+    if _stats_cache["v"] is not None and now_mono - _stats_cache["ts"] < 30:
+        return _stats_cache["v"]
+
+    # All round-trips are independent — issue them concurrently so the
+    # latency is max(RTT) instead of sum(RTTs). Totals use metadata-backed
+    # estimated counts; only the premium count filters, and that query is
+    # covered by the (premium, premium_expiry) index
+    users_count, premium_count, groups_count, files_count, db_stats = await asyncio.gather(
+        db.users.estimated_document_count(),
+        db.users.count_documents({"premium": True, "premium_expiry": {"$gt": datetime.now()}}),
+        db.groups.estimated_document_count(),
+        db.files.estimated_document_count(),
+        db.command("dbStats")
+    )
     used_storage = db_stats.get("dataSize", 0) / (1024 * 1024)  # MB
-    
-    return {
+
+    stats = {
         "users": users_count,
         "groups": groups_count,
         "files": files_count,
         "premium": premium_count,
         "used_storage": used_storage
     }
+    _stats_cache["ts"] = now_mono
+    _stats_cache["v"] = stats
+    return stats
 
 # --- TMDB API ---
-async def search_tmdb(query: str, media_type: str = "movie") -> Optional[Dict]:
-    """Search TMDB for movie/series details"""
-    if not TMDB_API_KEY:
-        return None
-    
+# TTL cache for TMDB lookups — the same title shows up many times during a
+# bulk index (qualities, seasons, episodes), so repeats become dict hits
+_tmdb_cache: Dict = {}
+_TMDB_CACHE_TTL = 3600
+_TMDB_CACHE_MAX = 4096
+
+def _tmdb_cache_get(key):
+    entry = _tmdb_cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+def _tmdb_cache_put(key, value):
+    if len(_tmdb_cache) >= _TMDB_CACHE_MAX:
+        # Evict the oldest quarter (dict preserves insertion order)
+        for old_key in list(_tmdb_cache)[:_TMDB_CACHE_MAX // 4]:
+            _tmdb_cache.pop(old_key, None)
+    _tmdb_cache[key] = (time.monotonic() + _TMDB_CACHE_TTL, value)
+
+# A second, persistent tier lives in the tmdb_cache collection so
+# re-indexes after a restart still skip live TMDB calls. Entries older
+# than 7 days are served stale while a background task refreshes them;
+# a TTL index drops anything untouched for 30 days.
+_TMDB_FRESH_SECONDS = 7 * 86400
+
+async def _tmdb_cached(cache_key: tuple, fetch) -> Optional[Dict]:
+    cached = _tmdb_cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    doc_id = ":".join(str(p) for p in cache_key)
+    doc = await db.tmdb_cache.find_one({"_id": doc_id})
+    if doc and doc.get("data") is not None:
+        data = doc["data"]
+        _tmdb_cache_put(cache_key, data)
+        age = (datetime.now() - doc["fetched_at"]).total_seconds()
+        if age > _TMDB_FRESH_SECONDS:
+            # Stale-while-revalidate: serve the old entry, refresh behind it
+            spawn_bg(_tmdb_refresh(doc_id, cache_key, fetch))
+        return data
+
+    data = await fetch()
+    if data is not None:
+        _tmdb_cache_put(cache_key, data)
+        await db.tmdb_cache.update_one(
+            {"_id": doc_id},
+            {"$set": {"data": data, "fetched_at": datetime.now()}},
+            upsert=True
+        )
+    return data
+
+async def _tmdb_refresh(doc_id: str, cache_key: tuple, fetch):
+    data = await fetch()
+    if data is not None:
+        _tmdb_cache_put(cache_key, data)
+        await db.tmdb_cache.update_one(
+            {"_id": doc_id},
+            {"$set": {"data": data, "fetched_at": datetime.now()}},
+            upsert=True
+        )
+
+async def _search_tmdb_live(query: str, media_type: str) -> Optional[Dict]:
     url = f"https://api.themoviedb.org/3/search/{media_type}"
     params = {
         "api_key": TMDB_API_KEY,
         "query": query,
         "language": "en-US"
     }
-    
+
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params, timeout=10) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if data.get("results"):
-                        return data["results"][0]
+        async with tmdb_session.get(url, params=params) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                if data.get("results"):
+                    return data["results"][0]
     except Exception as e:
         logger.error(f"TMDB search error: {e}")
-    
+
     return None
 
-async def get_tmdb_details(tmdb_id: int, media_type: str = "movie") -> Optional[Dict]:
-    """Get detailed info from TMDB"""
+async def search_tmdb(query: str, media_type: str = "movie") -> Optional[Dict]:
+    """Search TMDB for movie/series details (cached)"""
     if not TMDB_API_KEY:
         return None
-    
+
+    cache_key = ("search", media_type, query.strip().lower())
+    return await _tmdb_cached(cache_key, lambda: _search_tmdb_live(query, media_type))
+
+async def _get_tmdb_details_live(tmdb_id: int, media_type: str) -> Optional[Dict]:
     url = f"https://api.themoviedb.org/3/{media_type}/{tmdb_id}"
     params = {"api_key": TMDB_API_KEY, "language": "en-US"}
-    
+
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params, timeout=10) as resp:
-                if resp.status == 200:
-                    return await resp.json()
+        async with tmdb_session.get(url, params=params) as resp:
+            if resp.status == 200:
+                return await resp.json()
     except Exception as e:
         logger.error(f"TMDB details error: {e}")
-    
+
     return None
 
+async def get_tmdb_details(tmdb_id: int, media_type: str = "movie") -> Optional[Dict]:
+    """Get detailed info from TMDB (cached)"""
+    if not TMDB_API_KEY:
+        return None
+
+    cache_key = ("details", media_type, tmdb_id)
+    return await _tmdb_cached(cache_key, lambda: _get_tmdb_details_live(tmdb_id, media_type))
+
 # --- TEXT PROCESSING ---
+# Precompiled patterns (module-level so the regex cache is never hit on the hot path)
+# Single alternation covering usernames, links, quality tags and symbols so
+# clean_filename makes one pass over the string instead of six
+_CLEAN_RE = re.compile(
+    r'(?P<at>@\w+)'
+    r'|(?P<url>https?://\S+|www\.\S+|t\.me/\S+)'
+    r'|(?P<tag>(?i:1080p|720p|480p|BluRay|WEB-DL|x264|x265|HEVC|AAC|DDP5\.1|\.mkv|\.mp4|\.avi))'
+    r'|(?P<sym>[._\-])'
+    r'|(?P<bracket>[\[\]\(\)])'
+)
+_WS_RE = re.compile(r'\s+')
+
+def _clean_repl(m):
+    return ' ' if m.lastgroup == 'sym' else ''
+# Tiny fixed vocabularies — a substring scan over a pre-lowered tuple beats regex
+_QUALITIES = ("2160p", "1080p", "720p", "480p", "360p")
+_AUDIO_FORMATS = ("aac", "ddp5.1", "dd5.1", "ac3", "dts", "flac")
+# Season/episode in one scan: fast path for the common S01E05 form, then a
+# combined alternation so one finditer pass covers both markers
+_SE_FAST_RE = re.compile(r's\s?(\d{1,2})\s*e\s?(\d{1,3})', re.IGNORECASE)
+_SE_RE = re.compile(r'(?:s|season)\s?(?P<s>\d{1,2})|(?:e|episode|ep)\s?(?P<e>\d{1,3})', re.IGNORECASE)
+_SERIES_MARK_RE = re.compile(r'(S\d+|Season|E\d+|Episode)', re.IGNORECASE)
+
 def get_readable_size(size_in_bytes):
     if not size_in_bytes:
         return "Unknown"
@@ -184,52 +449,63 @@ def get_readable_size(size_in_bytes):
         size_in_bytes /= 1024.0
     return f"{size_in_bytes:.2f} PB"
 
+@functools.lru_cache(maxsize=4096)
 def clean_filename(text: str) -> str:
     """Clean and format filename"""
     if not text:
         return "Unknown File"
     
-    # Remove links, usernames, quality tags
-    text = re.sub(r'@\w+', '', text)
-    text = re.sub(r'(https?://\S+|www\.\S+|t\.me/\S+)', '', text)
-    text = re.sub(r'(?i)(1080p|720p|480p|BluRay|WEB-DL|x264|x265|HEVC|AAC|DDP5\.1|\.mkv|\.mp4|\.avi)', '', text)
-    
-    # Replace symbols with space
-    text = re.sub(r'[._\-]', ' ', text)
-    text = re.sub(r'[\[\]\(\)]', '', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    
+    # Strip links, usernames, quality tags and symbols in one pass
+    text = _CLEAN_RE.sub(_clean_repl, text)
+    text = _WS_RE.sub(' ', text).strip()
+
     return text
 
 def extract_quality(filename: str) -> str:
     """Extract quality from filename"""
-    qualities = ["2160p", "1080p", "720p", "480p", "360p"]
-    for q in qualities:
-        if q.lower() in filename.lower():
-            return q
-    return "Unknown"
+    fn = filename.lower()
+    return next((q for q in _QUALITIES if q in fn), "Unknown")
 
 def extract_audio(filename: str) -> str:
     """Extract audio format"""
-    audio_formats = ["AAC", "DDP5.1", "DD5.1", "AC3", "DTS", "FLAC"]
-    for fmt in audio_formats:
-        if fmt.lower() in filename.lower():
-            return fmt
+    fn = filename.lower()
+    for fmt in _AUDIO_FORMATS:
+        if fmt in fn:
+            return fmt.upper()
     return "Unknown"
 
 def extract_metadata(text: str) -> tuple:
     """Extract Season and Episode"""
+    m = _SE_FAST_RE.search(text)
+    if m:
+        return int(m.group(1)), int(m.group(2))
+
     s, e = 0, 0
-    s_match = re.search(r'(?:s|season)\s?(\d{1,2})', text, re.IGNORECASE)
-    e_match = re.search(r'(?:e|episode|ep)\s?(\d{1,3})', text, re.IGNORECASE)
-    
-    if s_match:
-        s = int(s_match.group(1))
-    if e_match:
-        e = int(e_match.group(1))
-    
+    for m in _SE_RE.finditer(text):
+        if s == 0 and m.group('s'):
+            s = int(m.group('s'))
+        elif e == 0 and m.group('e'):
+            e = int(m.group('e'))
+        if s and e:
+            break
+
     return s, e
 
+def build_file_match(query_text: str, mode: str) -> Dict:
+    """Build the files match filter for a search query.
+
+    "text" uses the $text index (inverted word list, index-backed);
+    "prefix" is a case-sensitive anchored regex on the pre-lowercased
+    file_name_lc field, which can walk the index prefix; "substring" is
+    the old unanchored scan, kept as the last resort for legacy documents
+    indexed before file_name_lc existed.
+    """
+    if mode == "text":
+        return {"$text": {"$search": query_text}}
+    if mode == "prefix":
+        return {"file_name_lc": {"$regex": f"^{re.escape(query_text.lower())}"}}
+    return {"file_name": {"$regex": re.escape(query_text), "$options": "i"}}
+
 def determine_category(chat_id: int, file_name: str) -> str:
     """Determine file category"""
     if chat_id == CH_PC_GAME:
@@ -237,67 +513,120 @@ def determine_category(chat_id: int, file_name: str) -> str:
     elif chat_id == CH_SINHALA_SUB:
         return "SinhalaSub"
     elif chat_id == CH_MOVIE_SERIES:
-        if re.search(r'(S\d+|Season|E\d+|Episode)', file_name, re.IGNORECASE):
+        if _SERIES_MARK_RE.search(file_name):
             return "Series"
         return "Movies"
     return "Others"
 
-# --- AUTO-DELETE MESSAGE ---
-async def auto_delete_message(context: ContextTypes.DEFAULT_TYPE, chat_id: int, message_id: int, delay: int = 300):
-    """Delete message after delay (default 5 minutes)"""
-    await asyncio.sleep(delay)
-    try:
-        await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-    except:
-        pass
+def _parse_batch(chat_id: int, names: List[str]) -> List[Dict]:
+    """Parse a batch of filenames (runs in a thread during bulk indexing)"""
+    out = []
+    for fname in names:
+        clean_name = clean_filename(fname)
+        season, episode = extract_metadata(fname)
+        out.append({
+            "file_name": clean_name,
+            "file_name_lc": clean_name.lower(),
+            "category": determine_category(chat_id, clean_name),
+            "season": season,
+            "episode": episode,
+            "quality": extract_quality(fname),
+            "audio": extract_audio(fname),
+        })
+    return out
+
+# --- AUTO-DELETE SCHEDULER ---
+# One worker drains a priority queue of (delete_at, chat_id, message_id)
+# tuples instead of parking a sleeping task per reply
+_delete_queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+_delete_worker_task = None
+
+def schedule_delete(chat_id: int, message_id: int, delay: int = 300):
+    """Queue a message for deletion after delay (default 5 minutes)"""
+    _delete_queue.put_nowait((time.monotonic() + delay, chat_id, message_id))
+
+async def _auto_delete_worker(bot):
+    while True:
+        delete_at, chat_id, message_id = await _delete_queue.get()
+        delay = delete_at - time.monotonic()
+        if delay > 0:
+            # Sleep in short steps so an earlier deadline queued later
+            # does not wait behind this one
+            await asyncio.sleep(min(delay, 1.0))
+            if delete_at > time.monotonic():
+                _delete_queue.put_nowait((delete_at, chat_id, message_id))
+                continue
+        # Coalesce everything expiring within 500ms, grouped per chat
+        batches = {chat_id: [message_id]}
+        cutoff = time.monotonic() + 0.5
+        while not _delete_queue.empty():
+            t, c, m = _delete_queue.get_nowait()
+            if t > cutoff:
+                _delete_queue.put_nowait((t, c, m))
+                break
+            batches.setdefault(c, []).append(m)
+        for c, ids in batches.items():
+            await _delete_batch(bot, c, ids)
+
+async def _delete_batch(bot, chat_id, message_ids):
+    """Delete a batch of messages: MTProto bulk call, Bot API as fallback"""
+    if pyro_client:
+        try:
+            for i in range(0, len(message_ids), 100):
+                await pyro_client.delete_messages(chat_id, message_ids[i:i + 100])
+            return
+        except FloodWait as e:
+            await asyncio.sleep(e.value)
+        except Exception:
+            pass
+    for mid in message_ids:
+        try:
+            await bot.delete_message(chat_id=chat_id, message_id=mid)
+        except Exception:
+            pass
 
 # --- START COMMAND ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     args = context.args
-    
-    # Register user
-    await db.users.update_one(
-        {"user_id": user.id},
-        {"$set": {
-            "user_id": user.id,
-            "first_name": user.first_name,
-            "username": user.username,
-            "joined_date": datetime.now()
-        }},
-        upsert=True
-    )
-    
+
+    # Register user (batched upsert)
+    register_user(user)
+
     # File download (deep link)
     if args and args[0].startswith("file_"):
         if MAINTENANCE_MODE and not await is_admin(user.id):
             msg = await update.message.reply_text("🚧 System is under maintenance.")
-            asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+            schedule_delete(msg.chat_id, msg.message_id)
             return
         
         file_db_id = args[0].split("_")[1]
-        file_data = await db.files.find_one({"_id": file_db_id})
+        file_data = await db.files.find_one(
+            {"_id": file_db_id},
+            {"file_id": 1, "file_name": 1, "file_size": 1, "file_type": 1, "category": 1}
+        )
         
         if file_data:
-            # Update history
-            await db.history.insert_one({
-                "user_id": user.id,
-                "file_name": file_data["file_name"],
-                "file_id": file_data["_id"],
-                "dl_date": datetime.now()
-            })
-            
-            # Keep only last 10
-            history_list = await db.history.find({"user_id": user.id}).sort("_id", -1).to_list(length=None)
-            if len(history_list) > 10:
-                delete_ids = [h["_id"] for h in history_list[10:]]
-                await db.history.delete_many({"_id": {"$in": delete_ids}})
-            
+            # Update history: capped embedded array, newest first, server-side
+            await db.users.update_one(
+                {"user_id": user.id},
+                {"$push": {"history": {
+                    "$each": [{
+                        "file_name": file_data["file_name"],
+                        "file_id": file_data["_id"],
+                        "dl_date": datetime.now()
+                    }],
+                    "$position": 0,
+                    "$slice": 10
+                }}},
+                upsert=True  # registration may still be queued for bulk flush
+            )
+
             caption = (
-                f"📂 **{file_data['file_name']}**\n\n"
-                f"🗂 **Category:** {file_data['category']}\n"
-                f"💾 **Size:** {get_readable_size(file_data.get('file_size', 0))}\n"
-                f"🤖 **Downloaded via SH BOTS**"
+                f"📂 <b>{html.escape(file_data['file_name'])}</b>\n\n"
+                f"🗂 <b>Category:</b> {file_data['category']}\n"
+                f"💾 <b>Size:</b> {get_readable_size(file_data.get('file_size', 0))}\n"
+                f"🤖 <b>Downloaded via SH BOTS</b>"
             )
             
             try:
@@ -305,22 +634,22 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     msg = await update.message.reply_video(
                         video=file_data["file_id"],
                         caption=caption,
-                        parse_mode=ParseMode.MARKDOWN
+                        parse_mode=ParseMode.HTML
                     )
                 else:
                     msg = await update.message.reply_document(
                         document=file_data["file_id"],
                         caption=caption,
-                        parse_mode=ParseMode.MARKDOWN
+                        parse_mode=ParseMode.HTML
                     )
-                asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+                schedule_delete(msg.chat_id, msg.message_id)
             except Exception as e:
                 msg = await update.message.reply_text("❌ File not available or deleted.")
-                asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+                schedule_delete(msg.chat_id, msg.message_id)
                 logger.error(f"Send error: {e}")
         else:
             msg = await update.message.reply_text("❌ File not found.")
-            asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+            schedule_delete(msg.chat_id, msg.message_id)
         return
     
     # Private chat start
@@ -330,11 +659,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             stats = await get_stats()
             text = (
-                f"👋 **Welcome {user.first_name}!**\n\n"
-                f"🗂 **Total Files:** `{stats['files']}`\n"
-                f"⚠️ **Access Restricted:**\n"
+                f"👋 <b>Welcome {html.escape(user.first_name or '')}!</b>\n\n"
+                f"🗂 <b>Total Files:</b> <code>{stats['files']}</code>\n"
+                f"⚠️ <b>Access Restricted:</b>\n"
                 f"මෙම බොට් භාවිතා කළ හැක්කේ අපගේ Group එක හරහා පමණි.\n\n"
-                f"👇 **Join Group or View Help:**"
+                f"👇 <b>Join Group or View Help:</b>"
             )
             kb = [
                 [InlineKeyboardButton("🔗 Join SH Film & Game Group", url=GROUP_LINK)],
@@ -346,30 +675,22 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     photo=START_IMAGE,
                     caption=text,
                     reply_markup=InlineKeyboardMarkup(kb),
-                    parse_mode=ParseMode.MARKDOWN
+                    parse_mode=ParseMode.HTML
                 )
             except:
                 msg = await update.message.reply_text(
                     text,
                     reply_markup=InlineKeyboardMarkup(kb),
-                    parse_mode=ParseMode.MARKDOWN
+                    parse_mode=ParseMode.HTML
                 )
-            asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+            schedule_delete(msg.chat_id, msg.message_id)
     
     # Group welcome
     elif update.effective_chat.id == AUTHORIZED_GROUP_ID:
-        # Register group
-        await db.groups.update_one(
-            {"group_id": update.effective_chat.id},
-            {"$set": {
-                "group_id": update.effective_chat.id,
-                "title": update.effective_chat.title,
-                "joined_date": datetime.now()
-            }},
-            upsert=True
-        )
+        # Register group (batched upsert)
+        register_group(update.effective_chat)
         msg = await update.message.reply_text("👋 Hi! Type any Movie/Series/Game name to search.")
-        asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+        schedule_delete(msg.chat_id, msg.message_id)
 
 # --- SEARCH HANDLER ---
 async def search_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -388,11 +709,16 @@ async def search_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     {"$set": {"user_id": new_admin_id, "added_date": datetime.now()}},
                     upsert=True
                 )
-                msg = await update.message.reply_text(f"✅ User `{new_admin_id}` is now an Admin!")
-                asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+                global _admin_set_ts
+                _admin_set_ts = 0.0
+                msg = await update.message.reply_text(
+                    f"✅ User <code>{new_admin_id}</code> is now an Admin!",
+                    parse_mode=ParseMode.HTML
+                )
+                schedule_delete(msg.chat_id, msg.message_id)
             except ValueError:
                 msg = await update.message.reply_text("❌ Invalid ID.")
-                asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+                schedule_delete(msg.chat_id, msg.message_id)
             return
     
     if not msg_text or msg_text.startswith("/"):
@@ -402,25 +728,53 @@ async def search_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if chat.type == ChatType.PRIVATE:
         if not await is_admin(user.id):
             msg = await update.message.reply_text(f"⚠️ Please use the group: {GROUP_LINK}")
-            asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+            schedule_delete(msg.chat_id, msg.message_id)
             return
     elif chat.type in [ChatType.GROUP, ChatType.SUPERGROUP]:
         if chat.id != AUTHORIZED_GROUP_ID:
             return
     
     context.user_data['search_query'] = msg_text
-    
-    # Search in database
-    pipeline = [
-        {"$match": {"file_name": {"$regex": msg_text, "$options": "i"}}},
-        {"$group": {"_id": "$category", "count": {"$sum": 1}}}
-    ]
-    
-    results = await db.files.aggregate(pipeline).to_list(length=None)
-    
+
+    # Search via the $text index first; fall back to regex for partial words.
+    # One $facet round-trip returns both the per-category counts and the
+    # first page of every category, which render_file_list serves from cache.
+    def search_pipeline(mode):
+        return [
+            {"$match": build_file_match(msg_text, mode)},
+            {"$facet": {
+                "counts": [{"$group": {"_id": "$category", "count": {"$sum": 1}}}],
+                "page": [
+                    {"$sort": {"category": 1, "season": 1, "episode": 1, "file_name": 1}},
+                    {"$limit": 60},
+                    {"$project": {"file_name": 1, "file_size": 1, "season": 1,
+                                  "episode": 1, "category": 1}}
+                ]
+            }}
+        ]
+
+    for search_mode in ("text", "prefix", "substring"):
+        result = (await db.files.aggregate(search_pipeline(search_mode)).to_list(length=1))[0]
+        if result["counts"]:
+            break
+
+    context.user_data['search_mode'] = search_mode
+    results = result["counts"]
+
+    # Bucket the pre-fetched first page by category and cache it (60s TTL)
+    pages: Dict[str, List] = {}
+    for f in result["page"]:
+        pages.setdefault(f["category"], []).append(f)
+    context.user_data['search_cache'] = {
+        'q': msg_text,
+        'ts': time.monotonic(),
+        'counts': {r["_id"]: r["count"] for r in results},
+        'pages': pages,
+    }
+
     if not results:
         msg = await update.message.reply_text("❌ No results found.")
-        asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+        schedule_delete(msg.chat_id, msg.message_id)
         return
     
     # Build category buttons
@@ -447,11 +801,11 @@ async def search_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         keyboard.append(row)
     
     msg = await update.message.reply_text(
-        f"🔎 **Search Results for:** `{msg_text}`\n👇 **Select a Category:**",
+        f"🔎 <b>Search Results for:</b> <code>{html.escape(msg_text)}</code>\n👇 <b>Select a Category:</b>",
         reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode=ParseMode.MARKDOWN
+        parse_mode=ParseMode.HTML
     )
-    asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+    schedule_delete(msg.chat_id, msg.message_id)
 
 # --- CALLBACK HANDLER ---
 async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -465,20 +819,20 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # User help
     if data == "user_help":
         msg_text = (
-            "🤖 **USER HELP GUIDE**\n\n"
-            "🔹 **How to Search?**\n"
+            "🤖 <b>USER HELP GUIDE</b>\n\n"
+            "🔹 <b>How to Search?</b>\n"
             "Join our group and type the Movie/Series/Game name.\n\n"
-            "🔹 **Commands:**\n"
-            "`/request <Name>` - Request missing file\n"
-            "`/clone` - Request bot source code\n"
-            "`/history` - View last 10 downloads\n\n"
+            "🔹 <b>Commands:</b>\n"
+            "<code>/request &lt;Name&gt;</code> - Request missing file\n"
+            "<code>/clone</code> - Request bot source code\n"
+            "<code>/history</code> - View last 10 downloads\n\n"
             f"🔗 Group: {GROUP_LINK}"
         )
         kb = [[InlineKeyboardButton("🔙 Back", callback_data="back_to_start")]]
         await query.edit_message_caption(
             caption=msg_text,
             reply_markup=InlineKeyboardMarkup(kb),
-            parse_mode=ParseMode.MARKDOWN
+            parse_mode=ParseMode.HTML
         )
         return
     
@@ -538,26 +892,41 @@ async def render_file_list(update, context, category, query_text, page):
     limit = 10
     skip = page * limit
     
-    # Build query
-    match_query = {
-        "file_name": {"$regex": query_text, "$options": "i"},
-        "category": category
-    }
-    
     # Series filters
     s_filter = context.user_data.get('filter_season')
     e_filter = context.user_data.get('filter_episode')
-    
-    if category == "Series":
-        if s_filter:
-            match_query["season"] = s_filter
-        if e_filter:
-            match_query["episode"] = e_filter
-    
-    total = await db.files.count_documents(match_query)
-    files = await db.files.find(match_query).sort([
-        ("season", 1), ("episode", 1), ("file_name", 1)
-    ]).skip(skip).limit(limit).to_list(length=limit)
+
+    # First page without filters is served from the search_handler cache
+    files = None
+    cache = context.user_data.get('search_cache')
+    if (page == 0 and not (s_filter or e_filter) and cache
+            and cache['q'] == query_text
+            and time.monotonic() - cache['ts'] < 60):
+        total = cache['counts'].get(category, 0)
+        bucket = cache['pages'].get(category, [])
+        if len(bucket) >= min(limit, total):
+            files = bucket[:limit]
+
+    if files is None:
+        search_mode = context.user_data.get('search_mode', 'substring')
+        match_query = build_file_match(query_text, search_mode)
+        match_query["category"] = category
+
+        if category == "Series":
+            if s_filter:
+                match_query["season"] = s_filter
+            if e_filter:
+                match_query["episode"] = e_filter
+
+        # Must match the $facet page sort exactly — skip() under a different
+        # ordering than page 0 would duplicate and drop files across pages
+        sort_spec = [("season", 1), ("episode", 1), ("file_name", 1)]
+
+        total = await db.files.count_documents(match_query)
+        files = await db.files.find(
+            match_query,
+            {"file_name": 1, "file_size": 1, "season": 1, "episode": 1}
+        ).sort(sort_spec).skip(skip).limit(limit).to_list(length=limit)
     
     # Build keyboard
     kb = []
@@ -579,7 +948,9 @@ async def render_file_list(update, context, category, query_text, page):
             kb.append([InlineKeyboardButton(" ".join(status) + " (Clear)", callback_data="ser_clear")])
     
     # File buttons
-    bot_username = context.bot.username
+    url_tmpl = context.application.bot_data.get(
+        'url_tmpl', f"https://t.me/{context.bot.username}?start=file_%s"
+    )
     for f in files:
         fname = f["file_name"]
         fsize = get_readable_size(f.get("file_size", 0))
@@ -597,8 +968,7 @@ async def render_file_list(update, context, category, query_text, page):
         else:
             display = fname[:30] + "..."
         
-        url = f"https://t.me/{bot_username}?start=file_{f['_id']}"
-        kb.append([InlineKeyboardButton(f"{display} ({fsize})", url=url)])
+        kb.append([InlineKeyboardButton(f"{display} ({fsize})", url=url_tmpl % f['_id'])])
     
     # Pagination
     nav_row = []
@@ -609,12 +979,12 @@ async def render_file_list(update, context, category, query_text, page):
     if nav_row:
         kb.append(nav_row)
     
-    msg_text = f"📂 **{category}**\n🔎 Query: `{query_text}`\n📊 Found: {total} (Page {page+1})"
+    msg_text = f"📂 <b>{category}</b>\n🔎 Query: <code>{html.escape(query_text)}</code>\n📊 Found: {total} (Page {page+1})"
     
     await update.callback_query.edit_message_text(
         msg_text,
         reply_markup=InlineKeyboardMarkup(kb),
-        parse_mode=ParseMode.MARKDOWN
+        parse_mode=ParseMode.HTML
     )
 
 async def render_series_filter_list(update, context, filter_type, query_text, page):
@@ -622,26 +992,28 @@ async def render_series_filter_list(update, context, filter_type, query_text, pa
     skip = page * limit
     
     col = "season" if filter_type == "Season" else "episode"
-    
-    # Get distinct values
-    pipeline = [
-        {"$match": {
-            "file_name": {"$regex": query_text, "$options": "i"},
-            "category": "Series",
-            col: {"$gt": 0}
-        }},
-        {"$group": {"_id": f"${col}"}},
-        {"$sort": {"_id": 1}}
-    ]
-    
-    all_vals = await db.files.aggregate(pipeline).to_list(length=None)
+
+    # Distinct values depend only on the query, not the page — cache them
+    # so flipping pages is a pure Python slice (60s TTL)
+    cache_key = (query_text, filter_type)
+    ser_cache = context.user_data.setdefault('ser_cache', {})
+    cached = ser_cache.get(cache_key)
+    if cached and time.monotonic() - cached[0] < 60:
+        all_vals = cached[1]
+    else:
+        search_mode = context.user_data.get('search_mode', 'substring')
+        match_query = build_file_match(query_text, search_mode)
+        match_query["category"] = "Series"
+        match_query[col] = {"$gt": 0}
+        all_vals = sorted(await db.files.distinct(col, match_query))
+        ser_cache[cache_key] = (time.monotonic(), all_vals)
+
     total = len(all_vals)
     current_slice = all_vals[skip:skip + limit]
-    
+
     kb = []
     row = []
-    for item in current_slice:
-        val = item["_id"]
+    for val in current_slice:
         prefix = "S" if filter_type == "Season" else "E"
         cb = f"ser_sel_{prefix}_{val}"
         row.append(InlineKeyboardButton(f"{prefix}{val:02}", callback_data=cb))
@@ -670,17 +1042,17 @@ async def render_series_filter_list(update, context, filter_type, query_text, pa
 # --- ADMIN DASHBOARD ---
 async def show_admin_dashboard(update, context):
     stats = await get_stats()
-    
+
     # System stats
-    cpu = psutil.cpu_percent()
-    ram = psutil.virtual_memory().percent
-    uptime_seconds = time.time() - psutil.boot_time()
+    snap = sys_snapshot()
+    cpu = snap["cpu"]
+    ram = snap["ram"]
+    uptime_seconds = time.monotonic() - BOT_START_TS
     uptime = str(timedelta(seconds=int(uptime_seconds)))
-    
+
     # Storage
-    disk = psutil.disk_usage('/')
-    free_storage = disk.free / (1024 * 1024)  # MB
-    
+    free_storage = snap["disk_free"] / (1024 * 1024)  # MB
+
     maint = "🔴 On" if MAINTENANCE_MODE else "🟢 Off"
     
     text = (
@@ -717,13 +1089,13 @@ async def show_admin_dashboard(update, context):
         await update.callback_query.edit_message_text(
             text,
             reply_markup=InlineKeyboardMarkup(kb),
-            parse_mode=ParseMode.MARKDOWN
+            parse_mode=ParseMode.HTML
         )
     else:
         await update.message.reply_text(
             text,
             reply_markup=InlineKeyboardMarkup(kb),
-            parse_mode=ParseMode.MARKDOWN
+            parse_mode=ParseMode.HTML
         )
 
 # --- ADMIN LOGIC ---
@@ -754,55 +1126,59 @@ async def handle_admin_logic(update, context):
     
     elif data == "adm_remove_admin":
         # List admins
-        admins = await db.admins.find({}).to_list(length=None)
+        admins = await db.admins.find({}, {"user_id": 1, "_id": 0}).to_list(length=100)
         if len(admins) <= 1:
             await query.answer("Cannot remove all admins!", show_alert=True)
             return
         
-        text = "👥 **Current Admins:**\n\n"
+        parts = ["👥 <b>Current Admins:</b>\n\n"]
         kb = []
         for adm in admins:
             if adm["user_id"] != OWNER_ID:
-                text += f"• ID: `{adm['user_id']}`\n"
+                parts.append(f"• ID: <code>{adm['user_id']}</code>\n")
                 kb.append([InlineKeyboardButton(
                     f"❌ Remove {adm['user_id']}",
                     callback_data=f"adm_rem_{adm['user_id']}"
                 )])
         kb.append([InlineKeyboardButton("🔙 Back", callback_data="adm_dashboard")])
-        
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode=ParseMode.MARKDOWN)
+
+        await query.edit_message_text("".join(parts), reply_markup=InlineKeyboardMarkup(kb), parse_mode=ParseMode.HTML)
     
     elif data.startswith("adm_rem_"):
         admin_id = int(data.split("_")[2])
         if admin_id != OWNER_ID:
             await db.admins.delete_one({"user_id": admin_id})
+            global _admin_set_ts
+            _admin_set_ts = 0.0
         await show_admin_dashboard(update, context)
     
     # File Requests
     elif data == "adm_view_req":
-        reqs = await db.requests.find({"status": "pending"}).limit(5).to_list(length=5)
+        reqs = await db.requests.find(
+            {"status": "pending"}, {"user_name": 1, "request_text": 1}
+        ).limit(5).to_list(length=5)
         
         if not reqs:
             await query.answer("No pending requests.", show_alert=True)
             return
         
-        text = "📥 **Pending File Requests**\n\n"
+        parts = ["📥 <b>Pending File Requests</b>\n\n"]
         kb = []
         for r in reqs:
-            text += f"🔹 {r.get('user_name', 'User')}: {r['request_text']}\n"
+            parts.append(f"🔹 {html.escape(r.get('user_name', 'User'))}: {html.escape(r['request_text'])}\n")
             kb.append([
                 InlineKeyboardButton(f"✅ Done", callback_data=f"adm_rdone_{r['_id']}"),
                 InlineKeyboardButton(f"❌ Cancel", callback_data=f"adm_rcanc_{r['_id']}")
             ])
         kb.append([InlineKeyboardButton("🔙 Back", callback_data="adm_dashboard")])
-        
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode=ParseMode.MARKDOWN)
+
+        await query.edit_message_text("".join(parts), reply_markup=InlineKeyboardMarkup(kb), parse_mode=ParseMode.HTML)
     
     elif data.startswith("adm_rdone_") or data.startswith("adm_rcanc_"):
         action = data.split("_")[1]
         req_id = data.split("_")[2]
         
-        req = await db.requests.find_one({"_id": req_id})
+        req = await db.requests.find_one({"_id": req_id}, {"user_id": 1, "request_text": 1})
         if req:
             uid = req["user_id"]
             rtext = req["request_text"]
@@ -811,8 +1187,8 @@ async def handle_admin_logic(update, context):
                 try:
                     await context.bot.send_message(
                         uid,
-                        f"✅ **Request Fulfilled!**\n\n`{rtext}` is now available. Search in bot!",
-                        parse_mode=ParseMode.MARKDOWN
+                        f"✅ <b>Request Fulfilled!</b>\n\n<code>{html.escape(rtext)}</code> is now available. Search in bot!",
+                        parse_mode=ParseMode.HTML
                     )
                 except:
                     pass
@@ -820,8 +1196,8 @@ async def handle_admin_logic(update, context):
                 try:
                     await context.bot.send_message(
                         uid,
-                        f"❌ **Request Unavailable**\n\nSorry, `{rtext}` not found.",
-                        parse_mode=ParseMode.MARKDOWN
+                        f"❌ <b>Request Unavailable</b>\n\nSorry, <code>{html.escape(rtext)}</code> not found.",
+                        parse_mode=ParseMode.HTML
                     )
                 except:
                     pass
@@ -832,27 +1208,29 @@ async def handle_admin_logic(update, context):
     
     # Clone Requests
     elif data == "adm_view_clones":
-        clones = await db.clone_requests.find({"status": "pending"}).limit(5).to_list(length=5)
+        clones = await db.clone_requests.find(
+            {"status": "pending"}, {"user_name": 1, "user_id": 1}
+        ).limit(5).to_list(length=5)
         
         if not clones:
             await query.answer("No clone requests.", show_alert=True)
             return
         
-        text = "🤖 **Clone Requests**\n\n"
+        parts = ["🤖 <b>Clone Requests</b>\n\n"]
         kb = []
         for c in clones:
-            text += f"🔸 {c.get('user_name', 'User')} (ID: {c['user_id']})\n"
+            parts.append(f"🔸 {html.escape(c.get('user_name', 'User'))} (ID: {c['user_id']})\n")
             kb.append([
                 InlineKeyboardButton(f"✅ Approve", callback_data=f"adm_cdone_{c['_id']}"),
                 InlineKeyboardButton(f"❌ Deny", callback_data=f"adm_ccanc_{c['_id']}")
             ])
         kb.append([InlineKeyboardButton("🔙 Back", callback_data="adm_dashboard")])
-        
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode=ParseMode.MARKDOWN)
+
+        await query.edit_message_text("".join(parts), reply_markup=InlineKeyboardMarkup(kb), parse_mode=ParseMode.HTML)
     
     elif data.startswith("adm_cdone_"):
         req_id = data.split("_")[2]
-        req = await db.clone_requests.find_one({"_id": req_id})
+        req = await db.clone_requests.find_one({"_id": req_id}, {"user_id": 1})
         
         if req:
             await send_source_code(context, req["user_id"])
@@ -862,7 +1240,7 @@ async def handle_admin_logic(update, context):
     
     elif data.startswith("adm_ccanc_"):
         req_id = data.split("_")[2]
-        req = await db.clone_requests.find_one({"_id": req_id})
+        req = await db.clone_requests.find_one({"_id": req_id}, {"user_id": 1})
         
         if req:
             try:
@@ -878,12 +1256,81 @@ async def send_source_code(context, user_id):
     try:
         await context.bot.send_message(
             user_id,
-            "📜 **Bot Source Code**\n\nSource code is available at:\nhttps://github.com/yourusername/sh-bot\n\n"
-            "Note: Configure your own tokens and MongoDB."
+            "📜 <b>Bot Source Code</b>\n\nSource code is available at:\nhttps://github.com/yourusername/sh-bot\n\n"
+            "Note: Configure your own tokens and MongoDB.",
+            parse_mode=ParseMode.HTML
         )
     except Exception as e:
         logger.error(f"Failed to send code: {e}")
 
+# --- FILE INGEST ---
+def file_doc_id(unique_id: str) -> str:
+    """Stable short document id for a file.
+
+    str(hash(...)) is randomized per process (PYTHONHASHSEED), so the same
+    file got a different _id after every restart and truncation raised the
+    collision odds; a blake2b digest is stable and collision-resistant.
+    """
+    return hashlib.blake2b(unique_id.encode(), digest_size=12).hexdigest()
+
+async def insert_file_docs(docs: List[Dict]) -> tuple:
+    """Insert a batch of file docs in one insert_many(ordered=False).
+
+    Duplicates are rejected server-side by the unique file_unique_id index
+    instead of a find_one pre-check per document.
+    Returns (inserted_ids, duplicates, errors).
+    """
+    # De-duplicate within the batch first: a repost inside one debounce
+    # window would otherwise make the write error discard the _id that
+    # did insert, undercounting and skipping the update-channel post
+    unique_docs: Dict[str, Dict] = {}
+    for d in docs:
+        unique_docs.setdefault(d["_id"], d)
+    dups = len(docs) - len(unique_docs)
+    docs = list(unique_docs.values())
+    inserted = set(unique_docs)
+    errs = 0
+    try:
+        await db.files.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for we in e.details.get("writeErrors", []):
+            inserted.discard(docs[we["index"]]["_id"])
+            if we.get("code") == 11000:
+                dups += 1
+            else:
+                errs += 1
+                logger.error(f"Index error: {we.get('errmsg')}")
+    except Exception as e:
+        logger.error(f"Index error: {e}")
+        return set(), 0, len(docs)
+    return inserted, dups, errs
+
+# Live channel posts are debounced into small insert_many batches
+_channel_doc_queue: asyncio.Queue = asyncio.Queue()
+_channel_worker_task = None
+
+async def _channel_index_worker(application):
+    while True:
+        batch = [await _channel_doc_queue.get()]
+        # Debounce: gather whatever else arrives within 1s, up to 50 docs
+        deadline = time.monotonic() + 1.0
+        while len(batch) < 50:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_channel_doc_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        inserted, _, _ = await insert_file_docs([doc for doc, _ in batch])
+        for doc, fname in batch:
+            if doc["_id"] not in inserted:
+                continue
+            logger.info(f"✅ Indexed: {doc['file_name']} | {doc['category']}")
+            if AUTO_UPDATE_CHANNEL and UPDATE_CHANNEL:
+                await post_to_update_channel(application, doc, fname)
+
 # --- CHANNEL POST HANDLER (AUTO-INDEX) ---
 async def channel_post_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Auto-index new posts from channels"""
@@ -909,11 +1356,6 @@ async def channel_post_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     else:
         return
     
-    # Check duplicate
-    exists = await db.files.find_one({"file_unique_id": unique_id})
-    if exists:
-        return
-    
     # Process metadata
     clean_name = clean_filename(fname)
     category = determine_category(chat_id, clean_name)
@@ -923,10 +1365,11 @@ async def channel_post_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     
     # Prepare file document
     file_doc = {
-        "_id": str(hash(unique_id))[:16],
+        "_id": file_doc_id(unique_id),
         "file_id": file_id,
         "file_unique_id": unique_id,
         "file_name": clean_name,
+        "file_name_lc": clean_name.lower(),
         "file_size": fsize,
         "file_type": ftype,
         "category": category,
@@ -936,23 +1379,65 @@ async def channel_post_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         "audio": audio,
         "message_id": msg.message_id,
         "channel_id": chat_id,
-        "indexed_date": datetime.now()
+        "indexed_date": datetime.now(timezone.utc)
     }
     
-    try:
-        await db.files.insert_one(file_doc)
-        logger.info(f"✅ Indexed: {clean_name} | {category}")
-        
-        # Post to update channel if enabled
-        if AUTO_UPDATE_CHANNEL and UPDATE_CHANNEL:
-            await post_to_update_channel(context, file_doc, fname)
-    
-    except DuplicateKeyError:
-        pass
-    except Exception as e:
-        logger.error(f"Index error: {e}")
+    # Hand off to the debounced batch inserter (dedup happens at insert)
+    _channel_doc_queue.put_nowait((file_doc, fname))
+
+# Telegram re-downloads a poster URL on every sendPhoto; after the first
+# upload we keep the returned file_id (in-process and on the details cache
+# doc) so repeat posts of the same title skip the image fetch entirely
+_poster_fid_cache: Dict[str, str] = {}
+
+async def _poster_file_id(details_doc_id: str) -> Optional[str]:
+    fid = _poster_fid_cache.get(details_doc_id)
+    if fid:
+        return fid
+    doc = await db.tmdb_cache.find_one({"_id": details_doc_id}, {"poster_file_id": 1})
+    fid = (doc or {}).get("poster_file_id")
+    if fid:
+        _poster_fid_cache[details_doc_id] = fid
+    return fid
+
+async def _remember_poster_file_id(details_doc_id: str, fid: str):
+    _poster_fid_cache[details_doc_id] = fid
+    await db.tmdb_cache.update_one(
+        {"_id": details_doc_id},
+        {"$set": {"poster_file_id": fid}},
+        upsert=True
+    )
 
-async def post_to_update_channel(context, file_doc, original_fname):
+# Title-level caption lines only depend on the TMDB details, so format and
+# escape them once per title; bulk indexes repost the same title many times
+_caption_base_cache: Dict[tuple, str] = {}
+
+def _tmdb_caption_base(media_type: str, tmdb_id, details: Dict) -> str:
+    key = (media_type, tmdb_id)
+    cached = _caption_base_cache.get(key)
+    if cached is not None:
+        return cached
+
+    title = details.get("title") or details.get("name", "Unknown")
+    overview = details.get("overview", "No description available.")[:200]
+    rating = details.get("vote_average", 0)
+    release = details.get("release_date") or details.get("first_air_date", "Unknown")
+    genres = ", ".join([g["name"] for g in details.get("genres", [])])
+
+    base = (
+        f"🎬 <b>{html.escape(title)}</b>\n\n"
+        f"📝 {html.escape(overview)}...\n\n"
+        f"⭐ <b>Rating:</b> {rating}/10\n"
+        f"📅 <b>Release:</b> {release}\n"
+        f"🎭 <b>Genres:</b> {html.escape(genres)}\n"
+    )
+
+    if len(_caption_base_cache) >= 1024:
+        _caption_base_cache.clear()
+    _caption_base_cache[key] = base
+    return base
+
+async def post_to_update_channel(application, file_doc, original_fname):
     """Post file card to update channel with TMDB details"""
     try:
         # Search TMDB
@@ -966,54 +1451,56 @@ async def post_to_update_channel(context, file_doc, original_fname):
             details = await get_tmdb_details(tmdb_id, media_type)
             
             if details:
-                # Build caption
-                title = details.get("title") or details.get("name", "Unknown")
-                overview = details.get("overview", "No description available.")[:200]
-                rating = details.get("vote_average", 0)
-                release = details.get("release_date") or details.get("first_air_date", "Unknown")
-                genres = ", ".join([g["name"] for g in details.get("genres", [])])
-                
-                caption = (
-                    f"🎬 **{title}**\n\n"
-                    f"📝 {overview}...\n\n"
-                    f"⭐ **Rating:** {rating}/10\n"
-                    f"📅 **Release:** {release}\n"
-                    f"🎭 **Genres:** {genres}\n"
-                    f"🎞 **Quality:** {file_doc['quality']}\n"
-                    f"🔊 **Audio:** {file_doc['audio']}\n"
-                )
-                
+                # Build caption: cached title-level lines plus per-file lines
+                parts = [
+                    _tmdb_caption_base(media_type, tmdb_id, details),
+                    f"🎞 <b>Quality:</b> {file_doc['quality']}\n"
+                    f"🔊 <b>Audio:</b> {file_doc['audio']}\n"
+                ]
+
                 if file_doc["category"] == "Series":
-                    caption += f"📺 **S{file_doc['season']:02}E{file_doc['episode']:02}**\n"
-                
-                caption += f"\n💾 **Size:** {get_readable_size(file_doc['file_size'])}\n"
+                    parts.append(f"📺 <b>S{file_doc['season']:02}E{file_doc['episode']:02}</b>\n")
+
+                parts.append(f"\n💾 <b>Size:</b> {get_readable_size(file_doc['file_size'])}\n")
+                caption = "".join(parts)
                 
-                # Get poster
+                # Get poster: reuse the uploaded file_id when we have one,
+                # fall back to the TMDB URL for the first post of a title
+                details_doc_id = f"details:{media_type}:{tmdb_id}"
                 poster_path = details.get("poster_path")
-                poster_url = f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else None
-                
+                poster = None
+                if poster_path:
+                    poster = (
+                        await _poster_file_id(details_doc_id)
+                        or f"https://image.tmdb.org/t/p/w500{poster_path}"
+                    )
+
                 # Button
-                bot_username = context.bot.username
-                kb = [[InlineKeyboardButton("📁 GET FILE", url=f"https://t.me/{bot_username}?start=file_{file_doc['_id']}")]]
-                
+                url_tmpl = application.bot_data.get(
+                    'url_tmpl', f"https://t.me/{application.bot.username}?start=file_%s"
+                )
+                kb = [[InlineKeyboardButton("📁 GET FILE", url=url_tmpl % file_doc['_id'])]]
+
                 # Send
-                if poster_url:
-                    await context.bot.send_photo(
+                if poster:
+                    sent = await application.bot.send_photo(
                         chat_id=UPDATE_CHANNEL,
-                        photo=poster_url,
+                        photo=poster,
                         caption=caption,
                         reply_markup=InlineKeyboardMarkup(kb),
-                        parse_mode=ParseMode.MARKDOWN
+                        parse_mode=ParseMode.HTML
                     )
+                    if poster.startswith("https://") and sent.photo:
+                        await _remember_poster_file_id(details_doc_id, sent.photo[-1].file_id)
                 else:
-                    await context.bot.send_message(
+                    await application.bot.send_message(
                         chat_id=UPDATE_CHANNEL,
                         text=caption,
                         reply_markup=InlineKeyboardMarkup(kb),
-                        parse_mode=ParseMode.MARKDOWN
+                        parse_mode=ParseMode.HTML
                     )
                 
-                logger.info(f"✅ Posted to update channel: {title}")
+                logger.info(f"✅ Posted to update channel: {details.get('title') or details.get('name', 'Unknown')}")
         
     except Exception as e:
         logger.error(f"Update channel error: {e}")
@@ -1038,10 +1525,10 @@ async def forward_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['last_message_id'] = msg.forward_from_message_id
     
     text = (
-        f"**Do you Want To Index This Channel/Group?**\n\n"
-        f"**Chat ID/Username:** `{forward_chat.id}`\n"
-        f"**Title:** {forward_chat.title or forward_chat.username}\n"
-        f"**Last Message ID:** {msg.forward_from_message_id}\n\n"
+        f"<b>Do you Want To Index This Channel/Group?</b>\n\n"
+        f"<b>Chat ID/Username:</b> <code>{forward_chat.id}</code>\n"
+        f"<b>Title:</b> {html.escape(forward_chat.title or forward_chat.username or '')}\n"
+        f"<b>Last Message ID:</b> {msg.forward_from_message_id}\n\n"
         f"ɴᴇᴇᴅ sᴇᴛsᴋɪᴘ 👉🏻 /setskip"
     )
     
@@ -1050,8 +1537,8 @@ async def forward_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
          InlineKeyboardButton("❌ CLOSE", callback_data="idx_close")]
     ]
     
-    reply = await msg.reply_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode=ParseMode.MARKDOWN)
-    asyncio.create_task(auto_delete_message(context, reply.chat_id, reply.message_id, delay=600))
+    reply = await msg.reply_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode=ParseMode.HTML)
+    schedule_delete(reply.chat_id, reply.message_id, delay=600)
 
 async def index_channel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle indexing confirmation"""
@@ -1073,25 +1560,28 @@ async def index_channel_callback(update: Update, context: ContextTypes.DEFAULT_T
             await query.answer("Error: No chat data found", show_alert=True)
             return
         
-        await query.edit_message_text("🔄 **Starting indexing...**\n\nThis may take a while.")
+        await query.edit_message_text(
+            "🔄 <b>Starting indexing...</b>\n\nThis may take a while.",
+            parse_mode=ParseMode.HTML
+        )
         
         # Start indexing in background
-        asyncio.create_task(index_channel_task(context, chat_id, last_msg_id, skip, query.message))
+        spawn_bg(index_channel_task(context, chat_id, last_msg_id, skip, query.message), _index_tasks)
 
 async def index_channel_task(context, chat_id, last_msg_id, skip, status_msg):
     """Index channel using Pyrogram"""
     try:
-        # Initialize Pyrogram client
-        user_client = Client(
-            BOT_SESSION,
-            api_id=API_ID,
-            api_hash=API_HASH,
-            bot_token=BOT_TOKEN
-        )
-        
-        await user_client.start()
-        
-        total_msgs = last_msg_id
+        # Reuse the shared client started in post_init; spinning up a fresh
+        # session per job costs an MTProto handshake and leaks on errors
+        user_client = pyro_client
+        if user_client is None:
+            await status_msg.edit_text(
+                "❌ <b>Indexing Failed</b>\n\nPyrogram client is not running (check API_ID/API_HASH).",
+                parse_mode=ParseMode.HTML
+            )
+            return
+
+        total_msgs = max(last_msg_id - skip, 1)
         fetched = 0
         saved = 0
         duplicates = 0
@@ -1103,18 +1593,105 @@ async def index_channel_task(context, chat_id, last_msg_id, skip, status_msg):
         batch_size = 200
         current_batch = 0
         total_batches = (total_msgs // batch_size) + 1
-        
-        for msg_id in range(skip + 1, last_msg_id + 1):
+        # Raw (file_id, unique_id, fname, fsize, ftype, msg_id) tuples;
+        # parsing happens per flush in a thread so the event loop keeps
+        # serving searches while a bulk index chews through filenames
+        pending: List[tuple] = []
+        insert_batch_size = 500
+
+        async def flush_pending():
+            nonlocal saved, duplicates, errors
+            if not pending:
+                return
+            batch = pending[:]
+            pending.clear()
+            parsed = await asyncio.to_thread(_parse_batch, chat_id, [b[2] for b in batch])
+            # One timestamp per insert batch: a syscall per doc adds up at
+            # indexing scale, and naive local times in Mongo are ambiguous
+            batch_ts = datetime.now(timezone.utc)
+            docs = []
+            for (file_id, unique_id, fname, fsize, ftype, msg_id), meta in zip(batch, parsed):
+                doc = {
+                    "_id": file_doc_id(unique_id),
+                    "file_id": file_id,
+                    "file_unique_id": unique_id,
+                    "file_size": fsize,
+                    "file_type": ftype,
+                    "message_id": msg_id,
+                    "channel_id": chat_id,
+                    "indexed_date": batch_ts
+                }
+                doc.update(meta)
+                docs.append(doc)
+            inserted, dups, errs = await insert_file_docs(docs)
+            saved += len(inserted)
+            duplicates += dups
+            errors += errs
+
+        last_edit_ts = 0.0
+        last_status_text = ""
+
+        async def update_progress():
+            nonlocal last_edit_ts, last_status_text
+            elapsed = time.time() - start_time
+            progress = (fetched / total_msgs) * 100
+            eta = (elapsed / fetched) * (total_msgs - fetched) if fetched > 0 else 0
+
+            current_batch = fetched // batch_size + 1
+            bar_length = 10
+            filled = int(progress / 10)
+            bar = "🟩" * filled + "⬜" * (bar_length - filled)
+
+            status_text = (
+                f"📊 <b>Indexing Progress</b>\n"
+                f"📦 Batch {current_batch}/{total_batches}\n"
+                f"{bar} {progress:.1f}%\n\n"
+                f"<b>Total Messages:</b> {total_msgs}\n"
+                f"<b>Total Fetched:</b> {fetched}\n"
+                f"<b>Saved:</b> {saved}\n"
+                f"<b>Duplicates:</b> {duplicates}\n"
+                f"<b>Deleted:</b> {deleted}\n"
+                f"<b>Non-Media:</b> {non_media}\n"
+                f"<b>Errors:</b> {errors}\n"
+                f"⏱️ <b>Elapsed:</b> {int(elapsed)}s\n"
+                f"⏰ <b>ETA:</b> {int(eta)}s"
+            )
+
+            if status_text == last_status_text:
+                return
             try:
-                msg: PyrogramMessage = await user_client.get_messages(chat_id, msg_id)
-                fetched += 1
-                
-                if msg.empty or msg.service:
+                await status_msg.edit_text(status_text, parse_mode=ParseMode.HTML)
+                last_edit_ts = time.monotonic()
+                last_status_text = status_text
+            except:
+                pass
+
+        # Bots cannot read history (messages.getHistory is user-only), so
+        # fetch explicit id batches instead: get_messages takes up to 200
+        # ids per call, still ~200x fewer round-trips than one id at a time
+        fetch_batch = 200
+
+        async def fetch_messages(ids):
+            while True:
+                try:
+                    return await user_client.get_messages(chat_id, message_ids=ids)
+                except FloodWait as e:
+                    logger.warning(f"FloodWait during indexing, sleeping {e.value}s")
+                    await asyncio.sleep(e.value)
+
+        def process_message(msg):
+            nonlocal deleted, non_media, errors
+            try:
+                if msg.empty:
+                    # Deleted slots come back as empty messages
+                    deleted += 1
+                    return
+                if msg.service:
                     non_media += 1
-                    continue
-                
+                    return
+
                 file_id, unique_id, fname, fsize, ftype = None, None, None, 0, "doc"
-                
+
                 if msg.document:
                     file_id = msg.document.file_id
                     unique_id = msg.document.file_unique_id
@@ -1128,101 +1705,63 @@ async def index_channel_task(context, chat_id, last_msg_id, skip, status_msg):
                     ftype = "video"
                 else:
                     non_media += 1
-                    continue
-                
-                # Check duplicate
-                exists = await db.files.find_one({"file_unique_id": unique_id})
-                if exists:
-                    duplicates += 1
-                    continue
-                
-                # Process
-                clean_name = clean_filename(fname)
-                category = determine_category(chat_id, clean_name)
-                season, episode = extract_metadata(fname)
-                quality = extract_quality(fname)
-                audio = extract_audio(fname)
-                
-                file_doc = {
-                    "_id": str(hash(unique_id))[:16],
-                    "file_id": file_id,
-                    "file_unique_id": unique_id,
-                    "file_name": clean_name,
-                    "file_size": fsize,
-                    "file_type": ftype,
-                    "category": category,
-                    "season": season,
-                    "episode": episode,
-                    "quality": quality,
-                    "audio": audio,
-                    "message_id": msg_id,
-                    "channel_id": chat_id,
-                    "indexed_date": datetime.now()
-                }
-                
-                await db.files.insert_one(file_doc)
-                saved += 1
-                
-            except Exception as e:
-                if "deleted" in str(e).lower():
-                    deleted += 1
-                else:
-                    errors += 1
-            
-            # Update progress every 50 messages
-            if fetched % 50 == 0:
-                elapsed = time.time() - start_time
-                progress = (fetched / total_msgs) * 100
-                eta = (elapsed / fetched) * (total_msgs - fetched) if fetched > 0 else 0
-                
-                current_batch = fetched // batch_size + 1
-                bar_length = 10
-                filled = int(progress / 10)
-                bar = "🟩" * filled + "⬜" * (bar_length - filled)
-                
-                status_text = (
-                    f"📊 **Indexing Progress**\n"
-                    f"📦 Batch {current_batch}/{total_batches}\n"
-                    f"{bar} {progress:.1f}%\n\n"
-                    f"**Total Messages:** {total_msgs}\n"
-                    f"**Total Fetched:** {fetched}\n"
-                    f"**Saved:** {saved}\n"
-                    f"**Duplicates:** {duplicates}\n"
-                    f"**Deleted:** {deleted}\n"
-                    f"**Non-Media:** {non_media}\n"
-                    f"**Errors:** {errors}\n"
-                    f"⏱️ **Elapsed:** {int(elapsed)}s\n"
-                    f"⏰ **ETA:** {int(eta)}s"
-                )
-                
-                try:
-                    await status_msg.edit_text(status_text, parse_mode=ParseMode.MARKDOWN)
-                except:
-                    pass
-            
-            await asyncio.sleep(0.1)  # Rate limiting
-        
-        await user_client.stop()
-        
+                    return
+
+                # Defer parsing to the per-batch thread; duplicates are
+                # rejected at insert by the unique index
+                pending.append((file_id, unique_id, fname, fsize, ftype, msg.id))
+            except Exception:
+                errors += 1
+
+        # Fetch a few batches concurrently; the wave size bounds in-flight
+        # requests so a full index overlaps round-trips without flooding
+        concurrency = 4
+        wave_span = fetch_batch * concurrency
+
+        for wave_start in range(skip + 1, last_msg_id + 1, wave_span):
+            wave_end = min(wave_start + wave_span, last_msg_id + 1)
+            chunks = [
+                list(range(s, min(s + fetch_batch, wave_end)))
+                for s in range(wave_start, wave_end, fetch_batch)
+            ]
+            results = await asyncio.gather(*(fetch_messages(ids) for ids in chunks))
+            fetched += wave_end - wave_start
+
+            for messages in results:
+                for msg in messages:
+                    process_message(msg)
+            if len(pending) >= insert_batch_size:
+                await flush_pending()
+
+            # Progress edits are rate-limited server-side; throttle
+            # by wall-clock instead of message count
+            if time.monotonic() - last_edit_ts >= 3.0:
+                await update_progress()
+
+        await flush_pending()
+
         # Final update
         final_text = (
-            f"✅ **Indexing Complete!**\n\n"
-            f"**Total Messages:** {total_msgs}\n"
-            f"**Fetched:** {fetched}\n"
-            f"**Saved:** {saved}\n"
-            f"**Duplicates:** {duplicates}\n"
-            f"**Deleted:** {deleted}\n"
-            f"**Non-Media:** {non_media}\n"
-            f"**Errors:** {errors}\n"
-            f"⏱️ **Time:** {int(time.time() - start_time)}s"
+            f"✅ <b>Indexing Complete!</b>\n\n"
+            f"<b>Total Messages:</b> {total_msgs}\n"
+            f"<b>Fetched:</b> {fetched}\n"
+            f"<b>Saved:</b> {saved}\n"
+            f"<b>Duplicates:</b> {duplicates}\n"
+            f"<b>Deleted:</b> {deleted}\n"
+            f"<b>Non-Media:</b> {non_media}\n"
+            f"<b>Errors:</b> {errors}\n"
+            f"⏱️ <b>Time:</b> {int(time.time() - start_time)}s"
         )
         
-        await status_msg.edit_text(final_text, parse_mode=ParseMode.MARKDOWN)
+        await status_msg.edit_text(final_text, parse_mode=ParseMode.HTML)
         
     except Exception as e:
         logger.error(f"Indexing error: {e}")
         try:
-            await status_msg.edit_text(f"❌ **Indexing Failed**\n\nError: {str(e)}")
+            await status_msg.edit_text(
+                f"❌ <b>Indexing Failed</b>\n\nError: {html.escape(str(e))}",
+                parse_mode=ParseMode.HTML
+            )
         except:
             pass
 
@@ -1233,13 +1772,13 @@ async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     stats = await get_stats()
-    cpu = psutil.cpu_percent()
-    ram = psutil.virtual_memory().percent
-    uptime_seconds = time.time() - psutil.boot_time()
+    snap = sys_snapshot()
+    cpu = snap["cpu"]
+    ram = snap["ram"]
+    uptime_seconds = time.monotonic() - BOT_START_TS
     uptime = str(timedelta(seconds=int(uptime_seconds)))
-    
-    disk = psutil.disk_usage('/')
-    free_storage = disk.free / (1024 * 1024)
+
+    free_storage = snap["disk_free"] / (1024 * 1024)
     
     text = (
         f"╭────[ 🗃 ᴅᴀᴛᴀʙᴀsᴇ 🗃 ]────⍟\n"
@@ -1261,21 +1800,20 @@ async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     msg = await update.message.reply_text(text)
-    asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+    schedule_delete(msg.chat_id, msg.message_id)
 
 async def view_members_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """View all members"""
     if not await is_admin(update.effective_user.id):
         return
     
-    users = await db.users.find({}).limit(50).to_list(length=50)
-    
-    text = "👥 **All Members** (First 50)\n\n"
-    for u in users:
-        text += f"• **ID:** `{u['user_id']}` - **Name:** {u.get('first_name', 'Unknown')}\n"
-    
-    msg = await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
-    asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+    parts = ["👥 <b>All Members</b> (First 50)\n"]
+    async for u in db.users.find({}, {"user_id": 1, "first_name": 1}).limit(50):
+        parts.append(f"• <b>ID:</b> <code>{u['user_id']}</code> - <b>Name:</b> {html.escape(u.get('first_name') or 'Unknown')}")
+    text = "\n".join(parts)
+
+    msg = await update.message.reply_text(text, parse_mode=ParseMode.HTML)
+    schedule_delete(msg.chat_id, msg.message_id)
 
 async def setskip_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Set skip messages for indexing"""
@@ -1286,17 +1824,17 @@ async def setskip_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         skip = int(context.args[0])
         context.user_data['skip_messages'] = skip
         msg = await update.message.reply_text(f"✅ Skip set to: {skip}")
-        asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+        schedule_delete(msg.chat_id, msg.message_id)
     except:
         msg = await update.message.reply_text("Usage: /setskip <number>")
-        asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+        schedule_delete(msg.chat_id, msg.message_id)
 
 async def request_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Request a file"""
     txt = " ".join(context.args)
     if not txt:
         msg = await update.message.reply_text("Usage: /request <Movie/Series Name>")
-        asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+        schedule_delete(msg.chat_id, msg.message_id)
         return
     
     await db.requests.insert_one({
@@ -1308,14 +1846,14 @@ async def request_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     })
     
     msg = await update.message.reply_text("✅ Request sent to admins!")
-    asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+    schedule_delete(msg.chat_id, msg.message_id)
 
 async def clone_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Request bot clone"""
-    exists = await db.clone_requests.find_one({
-        "user_id": update.effective_user.id,
-        "status": "pending"
-    })
+    exists = await db.clone_requests.find_one(
+        {"user_id": update.effective_user.id, "status": "pending"},
+        {"_id": 1}
+    )
     
     if exists:
         msg = await update.message.reply_text("⏳ You already have a pending request.")
@@ -1328,40 +1866,114 @@ async def clone_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         })
         msg = await update.message.reply_text("✅ Clone request sent!")
     
-    asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+    schedule_delete(msg.chat_id, msg.message_id)
 
 async def history_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """View download history"""
-    history = await db.history.find({"user_id": update.effective_user.id}).sort("_id", -1).limit(10).to_list(length=10)
-    
+    user_doc = await db.users.find_one({"user_id": update.effective_user.id}, {"history": 1})
+    history = (user_doc or {}).get("history", [])
+
     if not history:
         msg = await update.message.reply_text("📜 History is empty.")
-        asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+        schedule_delete(msg.chat_id, msg.message_id)
         return
     
-    text = "📜 **Your Download History**\n\n"
+    parts = ["📜 <b>Your Download History</b>\n"]
     for h in history:
         date_str = h["dl_date"].strftime("%Y-%m-%d %H:%M")
-        text += f"⏰ {date_str} - {h['file_name'][:30]}...\n"
-    
-    msg = await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
-    asyncio.create_task(auto_delete_message(context, msg.chat_id, msg.message_id))
+        parts.append(f"⏰ {date_str} - {html.escape(h['file_name'][:30])}...")
+    text = "\n".join(parts)
+
+    msg = await update.message.reply_text(text, parse_mode=ParseMode.HTML)
+    schedule_delete(msg.chat_id, msg.message_id)
 
 # --- MAIN ---
 async def post_init(application):
     """Post initialization"""
     await init_db()
+
+    # Cache the bot identity once; handlers format deep links from the template
+    me = await application.bot.get_me()
+    application.bot_data['username'] = me.username
+    application.bot_data['url_tmpl'] = f"https://t.me/{me.username}?start=file_%s"
+
+    # Shared Pyrogram client for bulk deletes
+    global pyro_client
+    if API_ID and API_HASH:
+        try:
+            pyro_client = Client(BOT_SESSION, api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
+            await pyro_client.start()
+        except Exception as e:
+            pyro_client = None
+            logger.error(f"Pyrogram client start failed: {e}")
+
+    global BOT_START_TS
+    BOT_START_TS = time.monotonic()
+
+    # Prime the CPU counter so the first dashboard reading is meaningful
+    # (psutil.cpu_percent() reports usage since the previous call)
+    psutil.cpu_percent()
+
+    # Auto-delete worker
+    global _delete_worker_task
+    _delete_worker_task = asyncio.create_task(_auto_delete_worker(application.bot))
+
+    # Channel-post batch inserter
+    global _channel_worker_task
+    _channel_worker_task = asyncio.create_task(_channel_index_worker(application))
+
     logger.info("✅ Bot initialized")
 
 async def post_shutdown(application):
     """Cleanup"""
+    workers = [t for t in (_delete_worker_task, _channel_worker_task, _flusher_task) if t]
+    # Index jobs can run for hours — cancel rather than wait
+    cancelled = workers + list(_index_tasks)
+    for task in cancelled:
+        task.cancel()
+    # Let short in-flight work (flushes, TMDB refreshes) finish and collect
+    # the cancellations, but never hold shutdown past a deadline
+    draining = list(_bg_tasks) + cancelled
+    if draining:
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*draining, return_exceptions=True), timeout=10
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Background tasks did not finish within shutdown deadline")
+    await flush_registrations()
+    if pyro_client:
+        try:
+            await pyro_client.stop()
+        except Exception:
+            pass
+    if tmdb_session:
+        await tmdb_session.close()
     if mongo_client:
+        # Sync on the pinned motor 3.3.2 (close() returns None, not a
+        # coroutine) — runs last so nothing above needs the connection
         mongo_client.close()
     logger.info("✅ Bot shutdown")
 
 def main():
     """Main function"""
-    app = ApplicationBuilder().token(BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
+    app = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        # Background tasks (auto-delete, update-channel posts, index status
+        # edits) issue Bot API calls concurrently with handlers; widen the
+        # pool and wait instead of dropping requests after the default 1s
+        .connection_pool_size(128)
+        .pool_timeout(30)
+        .get_updates_connection_pool_size(1)
+        .get_updates_pool_timeout(30)
+        .connect_timeout(10)
+        .read_timeout(30)
+        .write_timeout(30)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Commands
     app.add_handler(CommandHandler("start", start))
@@ -1380,7 +1992,18 @@ def main():
     app.add_handler(CallbackQueryHandler(callback_handler))
     
     logger.info("🔥 SH ULTRA BOT V2 Started!")
-    app.run_polling()
+    if WEBHOOK_URL:
+        # Webhook pushes updates as they happen instead of paying a
+        # getUpdates round-trip per poll; token as url_path keeps the
+        # endpoint unguessable
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            url_path=BOT_TOKEN,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{BOT_TOKEN}"
+        )
+    else:
+        app.run_polling()
 
 if __name__ == '__main__':
     main()